@@ -307,9 +307,7 @@ class TradingEnv(gym.Env):
             for col in self.historical_info.columns
             if not col.startswith("date_")
         ]
-        history_df = pd.DataFrame(
-            [self.historical_info[c] for c in columns], columns=columns
-        )
+        history_df = self.historical_info.to_df()[columns]
         history_df.set_index("date", inplace=True)
         history_df.sort_index(inplace=True)
 
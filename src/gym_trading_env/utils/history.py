@@ -1,39 +1,309 @@
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, Callable, Dict, List, Tuple, Union
 
 import numpy as np
 import pandas as pd
 
+_SCALAR_TYPES = (
+    bool, int, float, np.bool_,
+    np.int8, np.int16, np.int32, np.int64,
+    np.uint8, np.uint16, np.uint32, np.uint64,
+    np.float16, np.float32, np.float64,
+)
+
+
+class _AnyScalar:
+    # Accepted types of an object column: anything but a list or dict, which
+    # add() must reject for a scalar entry.
+    def __contains__(self, tp: type) -> bool:
+        return not issubclass(tp, (list, dict))
+
 
 class History:
 
-    def __init__(self, max_size: int = 10000):
+    def __init__(self, max_size: int = 10000, numeric_dtype: Any = np.float64):
         self.max_size = max_size
+        self.numeric_dtype = np.dtype(numeric_dtype)
         self.columns: List[str] = []
-        self.history_storage: np.ndarray = np.empty((0, 0))
+        self._column_index: Dict[str, int] = {}
+        self._keys: Tuple[str, ...] = ()
+        self._layout: List[Tuple[str, str, Any, Tuple[str, ...], Any]] = []
+        self.history_storage: Dict[str, np.ndarray] = {}
+        self._arrays: List[np.ndarray] = []
+        self._accepts: List[Any] = []
         self.size: int = 0
+        self._head: int = 0
 
     def set(self, **kwargs: Any) -> None:
         self.columns = self._flatten_columns(kwargs)
         self.width = len(self.columns)
-        self.history_storage = np.zeros(
-            shape=(self.max_size, self.width), dtype="O"
-        )
+        self._column_index = {column: i for i, column in enumerate(self.columns)}
+        self._keys = tuple(kwargs)
+        values = self._flatten_values(kwargs)
+        self.history_storage = {
+            column: np.empty(self.max_size, dtype=self._infer_dtype(value))
+            for column, value in zip(self.columns, values)
+        }
+        self._arrays = list(self.history_storage.values())
+        self._accepts = [self._accepted_types(a.dtype) for a in self._arrays]
+        writers = {
+            "scalar": self._scalar_writer,
+            "list": self._list_writer,
+            "dict": self._dict_writer,
+        }
+        self._layout = []
+        start = 0
+        for name, value in kwargs.items():
+            kind = self._value_kind(value)
+            stop = start + (1 if kind == "scalar" else len(value))
+            columns = range(start, stop)
+            keys = tuple(value.keys()) if kind == "dict" else None
+            self._layout.append(
+                (name, kind, writers[kind](columns, keys), columns, keys)
+            )
+            start = stop
         self.size = 0
+        self._head = 0
         self.add(**kwargs)
 
     def add(self, **kwargs: Any) -> None:
+        if tuple(kwargs) == self._keys:
+            # Same keys as set(): each writer checks its value and writes it
+            # straight into its columns. A rejected value undoes the row.
+            size, head = self.size, self._head
+            t = self._next_slot()
+            saved = (
+                [storage[t] for storage in self._arrays]
+                if size == self.max_size
+                else None
+            )
+            for name, _, writer, _, _ in self._layout:
+                try:
+                    writer(t, kwargs[name])
+                except ValueError as e:
+                    self.size, self._head = size, head
+                    if saved is not None:
+                        for storage, value in zip(self._arrays, saved):
+                            storage[t] = value
+                    raise ValueError(f"Value mismatch for '{name}': {e}") from None
+            return
+
         values = self._flatten_values(kwargs)
         if len(values) != self.width:
             raise ValueError(
                 f"Value mismatch. Expected {self.width} values, got {len(values)}"
             )
+        t = self._next_slot()
+        for i, value in enumerate(values):
+            self._store(i, t, value)
+
+    def extend(self, **kwargs: Any) -> None:
+        if not self._layout:
+            raise ValueError("History.set() must be called before extend()")
+        if tuple(kwargs) != self._keys:
+            raise ValueError(
+                f"Key mismatch. Expected {list(self._keys)}, got {list(kwargs)}"
+            )
 
+        blocks = {}
+        for name, kind, _, columns, keys in self._layout:
+            value = kwargs[name]
+            if kind == "scalar":
+                value = np.asarray(value)
+                if value.ndim != 1:
+                    raise ValueError(
+                        f"Expected '{name}' to be 1-dimensional, got shape {value.shape}"
+                    )
+                blocks[columns[0]] = value
+                continue
+            if isinstance(value, dict):
+                if kind != "dict" or set(value) != set(keys):
+                    raise ValueError(
+                        f"Key mismatch for '{name}'. Expected {list(keys or ())}, "
+                        f"got {list(value)}"
+                    )
+                value = np.column_stack([value[key] for key in keys])
+            value = np.asarray(value)
+            if value.ndim != 2 or value.shape[1] != len(columns):
+                raise ValueError(
+                    f"Expected '{name}' of shape (n, {len(columns)}), got {value.shape}"
+                )
+            for j, i in enumerate(columns):
+                blocks[i] = value[:, j]
+
+        lengths = {len(block) for block in blocks.values()}
+        if len(lengths) != 1:
+            raise ValueError(f"Row count mismatch between columns: {sorted(lengths)}")
+        n = lengths.pop()
+
+        # Only the last max_size rows can survive; write them in at most two
+        # slices around the wrap point of the ring buffer.
+        n_kept = min(n, self.max_size)
+        start = (self._head + self.size) % self.max_size
+        first = min(n_kept, self.max_size - start)
+        for i, block in blocks.items():
+            block = block[n - n_kept :]
+            self._store(i, slice(start, start + first), block[:first])
+            if first < n_kept:
+                self._store(i, slice(0, n_kept - first), block[first:])
+
+        total = self.size + n_kept
+        self._head = (self._head + max(0, total - self.max_size)) % self.max_size
+        self.size = min(total, self.max_size)
+
+    def _next_slot(self) -> int:
         if self.size < self.max_size:
-            self.history_storage[self.size, :] = values
+            t = self.size
             self.size += 1
         else:
-            self.history_storage = np.roll(self.history_storage, -1, axis=0)
-            self.history_storage[-1, :] = values
+            # Buffer is full: overwrite the oldest row and advance the head
+            # instead of shifting every column.
+            t = self._head
+            self._head = (self._head + 1) % self.max_size
+        return t
+
+    # Writers are closures over the column arrays so the per-step loop does
+    # no attribute lookups; _widen replaces arrays in place in those lists.
+    def _scalar_writer(self, columns: range, keys: Any) -> Callable[[int, Any], None]:
+        i = columns[0]
+        arrays, accepts, store = self._arrays, self._accepts, self._store
+
+        def write(t: int, value: Any) -> None:
+            if type(value) in accepts[i]:
+                try:
+                    arrays[i][t] = value
+                    return
+                except OverflowError:
+                    pass
+            if isinstance(value, (list, dict)):
+                raise ValueError(
+                    f"expected a single value, got {type(value).__name__}"
+                )
+            store(i, t, value)
+
+        return write
+
+    def _list_writer(self, columns: range, keys: Any) -> Callable[[int, Any], None]:
+        write_items = self._items_writer(columns)
+
+        def write(t: int, value: Any) -> None:
+            if not isinstance(value, list) or len(value) != len(columns):
+                raise ValueError(f"expected a list of {len(columns)} values")
+            write_items(t, value)
+
+        return write
+
+    def _dict_writer(self, columns: range, keys: Any) -> Callable[[int, Any], None]:
+        write_items = self._items_writer(columns)
+
+        def write(t: int, value: Any) -> None:
+            if not isinstance(value, dict) or len(value) != len(keys):
+                raise ValueError(f"expected a dict with keys {list(keys)}")
+            try:
+                items = [value[key] for key in keys]
+            except KeyError:
+                raise ValueError(f"expected a dict with keys {list(keys)}") from None
+            write_items(t, items)
+
+        return write
+
+    def _items_writer(self, columns: range) -> Callable[[int, Any], None]:
+        arrays, accepts, store = self._arrays, self._accepts, self._store
+
+        def write_items(t: int, items: Any) -> None:
+            for i, item in zip(columns, items):
+                if type(item) in accepts[i]:
+                    try:
+                        arrays[i][t] = item
+                        continue
+                    except OverflowError:
+                        pass
+                store(i, t, item)
+
+        return write_items
+
+    @staticmethod
+    def _value_kind(value: Any) -> str:
+        if isinstance(value, list):
+            return "list"
+        if isinstance(value, dict):
+            return "dict"
+        return "scalar"
+
+    def _infer_dtype(self, value: Any) -> np.dtype:
+        if isinstance(value, (bool, int, float, np.generic)):
+            dtype = np.asarray(value).dtype
+            if dtype.kind == "f":
+                return self.numeric_dtype
+            if dtype.kind in "biuM":
+                return dtype
+        return np.dtype(object)
+
+    @staticmethod
+    def _fits(dtype: np.dtype, value: Any) -> bool:
+        if dtype.kind == "O":
+            return True
+        if isinstance(value, np.generic):
+            value_dtype = value.dtype
+        else:
+            value_dtype = np.asarray(value).dtype
+        if value_dtype.kind == "O":
+            return False
+        if dtype.kind == "f":
+            return value_dtype.kind in "biuf"
+        # numpy silently truncates 0.37 to 0 in an int column, so anything
+        # that is not a safe cast has to widen the column first.
+        return value_dtype == dtype or np.can_cast(
+            value_dtype, dtype, casting="safe"
+        )
+
+    def _accepted_types(self, dtype: np.dtype) -> Any:
+        # Scalar types a column can take without widening, so the per-step
+        # write only needs a type() lookup. Datetime columns always go through
+        # _store to check their unit.
+        if dtype.kind == "O":
+            return _AnyScalar()
+        if dtype.kind == "M":
+            return frozenset()
+        return frozenset(tp for tp in _SCALAR_TYPES if self._fits(dtype, tp(0)))
+
+    def _store(self, i: int, t: Any, value: Any) -> None:
+        storage = self._arrays[i]
+        if type(value) in self._accepts[i]:
+            try:
+                storage[t] = value
+                return
+            except OverflowError:
+                pass
+        if not self._fits(storage.dtype, value):
+            storage = self._widen(i, value)
+        storage[t] = value
+
+    def _widen(self, i: int, value: Any) -> np.ndarray:
+        # Widen the column (int -> float, or object for None and other
+        # non-numeric values) for the rest of the run.
+        storage = self._arrays[i]
+        try:
+            dtype = np.result_type(storage.dtype, np.asarray(value).dtype)
+        except TypeError:
+            dtype = np.dtype(object)
+        if dtype.kind == "f":
+            dtype = self.numeric_dtype
+        if dtype.kind not in "biufM":
+            storage = self._as_object(storage)
+        else:
+            storage = storage.astype(dtype)
+        self._arrays[i] = storage
+        self.history_storage[self.columns[i]] = storage
+        self._accepts[i] = self._accepted_types(storage.dtype)
+        return storage
+
+    @staticmethod
+    def _as_object(values: np.ndarray) -> np.ndarray:
+        # astype(object) turns datetime64[ns] into plain ints; going through a
+        # list keeps the numpy scalars.
+        data = np.empty(len(values), dtype=object)
+        data[:] = list(values)
+        return data
 
     def _flatten_columns(self, data: Dict[str, Any]) -> List[str]:
         columns = []
@@ -61,33 +331,86 @@ class History:
     def __getitem__(
         self, arg: Union[str, int, List[str], Tuple[str, Union[int, slice]]]
     ) -> Union[Any, Dict[str, Any], np.ndarray]:
-        data = self.history_storage[: self.size]
         if isinstance(arg, tuple):
             column, t = arg
-            col_idx = self._get_column_index(column)
-            return data[t, col_idx]
+            if not isinstance(t, (int, np.integer)):
+                return self._column(column)[t]
+            self._get_column_index(column)
+            return self.history_storage[column][self._physical_index(t)]
         elif isinstance(arg, str):
-            col_idx = self._get_column_index(arg)
-            return data[:, col_idx]
+            return self._column(arg)
         elif isinstance(arg, int):
-            return dict(zip(self.columns, data[arg]))
+            t = self._physical_index(arg)
+            return {
+                column: self.history_storage[column][t] for column in self.columns
+            }
         elif isinstance(arg, list):
-            col_indices = [self._get_column_index(col) for col in arg]
-            return data[:, col_indices]
+            columns = [self._column(column) for column in arg]
+            try:
+                dtype = np.result_type(*columns) if columns else np.dtype(object)
+            except TypeError:
+                dtype = np.dtype(object)
+            data = np.empty((self.size, len(columns)), dtype=dtype)
+            for i, values in enumerate(columns):
+                data[:, i] = self._as_object(values) if dtype == object else values
+            return data
         raise TypeError(f"Invalid argument type: {type(arg)}")
 
     def __setitem__(self, arg: Tuple[str, Union[int, slice]], value: Any):
         column, t = arg
-        col_idx = self._get_column_index(column)
-        self.history_storage[t, col_idx] = value
+        self._store(self._get_column_index(column), self._physical_index(t), value)
+
+    def _physical_index(self, t: Any) -> Union[int, np.ndarray]:
+        if isinstance(t, slice):
+            return (np.arange(*t.indices(self.size)) + self._head) % self.max_size
+        if not isinstance(t, (int, np.integer)):
+            t = np.asarray(t)
+            if t.dtype == bool:
+                if t.shape != (self.size,):
+                    raise IndexError(
+                        f"Boolean index of shape {t.shape} does not match size {self.size}"
+                    )
+                t = np.flatnonzero(t)
+            elif t.size == 0:
+                # np.asarray([]) is float64, which numpy refuses as an index.
+                t = t.astype(np.intp)
+            if ((t < -self.size) | (t >= self.size)).any():
+                raise IndexError(f"Index {t} is out of bounds for size {self.size}")
+            return (t % self.size + self._head) % self.max_size
+        if t < 0:
+            t += self.size
+        if not 0 <= t < self.size:
+            raise IndexError(f"Index {t} is out of bounds for size {self.size}")
+        return (t + self._head) % self.max_size
+
+    def tail(self, column: str, k: int) -> np.ndarray:
+        # Unless the range crosses the wrap point, the result is a view into
+        # the ring storage: later adds overwrite it once the buffer is full.
+        self._get_column_index(column)
+        if k < 0:
+            raise ValueError(f"k must be non-negative, got {k}")
+        k = min(k, self.size)
+        storage = self.history_storage[column]
+        start = (self._head + self.size - k) % self.max_size
+        if start + k <= self.max_size:
+            return storage[start : start + k]
+        return np.concatenate(
+            (storage[start:], storage[: start + k - self.max_size])
+        )
+
+    def _column(self, column: str) -> np.ndarray:
+        return self.tail(column, self.size)
 
     def _get_column_index(self, column: str) -> int:
         try:
-            return self.columns.index(column)
-        except ValueError:
+            return self._column_index[column]
+        except KeyError:
             raise ValueError(
                 f"Feature '{column}' does not exist. Available features: {self.columns}"
             )
 
     def to_df(self) -> pd.DataFrame:
-        return pd.DataFrame(self.history_storage[: self.size], columns=self.columns)
+        return pd.DataFrame(
+            {column: self._column(column) for column in self.columns},
+            columns=self.columns,
+        )
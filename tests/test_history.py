@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+
+from gym_trading_env.utils.history import History
+
+
+def test_int_column_widens_to_float():
+    history = History(max_size=4)
+    history.set(step=1, price=1)
+    history.add(step=2, price=2.5)
+
+    assert history.history_storage["price"].dtype == np.float64
+    assert list(history["price"]) == [1.0, 2.5]
+    assert history.history_storage["step"].dtype.kind == "i"
+
+
+def test_int_column_widens_to_numeric_dtype():
+    history = History(max_size=4, numeric_dtype=np.float32)
+    history.set(price=1)
+    history.add(price=2.5)
+
+    assert history.history_storage["price"].dtype == np.float32
+
+
+def test_none_widens_to_object():
+    history = History(max_size=4)
+    history.set(price=1.5)
+    history.add(price=None)
+
+    assert history.history_storage["price"].dtype == object
+    assert history["price", 0] == 1.5
+    assert history["price", 1] is None
+
+
+def test_datetime_widens_to_object():
+    date = np.datetime64("2024-01-01T00:00:00", "ns")
+    history = History(max_size=4)
+    history.set(date=date)
+    history.add(date="not a date")
+
+    assert history.history_storage["date"].dtype == object
+    assert history["date", 0] == date
+    assert history["date", 1] == "not a date"
+
+
+def test_datetime_column_keeps_datetime_dtype():
+    history = History(max_size=4)
+    history.set(date=np.datetime64("2024-01-01", "ns"))
+    history.add(date=np.datetime64("2024-01-02", "ns"))
+
+    assert history.history_storage["date"].dtype.kind == "M"
+
+
+@pytest.mark.parametrize("n_rows", [1, 3, 4, 5, 9, 13])
+def test_add_keeps_last_rows_in_order(n_rows):
+    history = History(max_size=4)
+    history.set(step=0, pair=[0, 0])
+    for step in range(1, n_rows):
+        history.add(step=step, pair=[step, -step])
+
+    expected = list(range(max(0, n_rows - 4), n_rows))
+    assert len(history) == len(expected)
+    assert list(history["step"]) == expected
+    assert list(history["pair_1"]) == [-step for step in expected]
+    assert history["step", -1] == n_rows - 1
+    assert list(history["step", ::-1]) == expected[::-1]
+    assert list(history.to_df()["step"]) == expected
+
+
+def test_setitem_after_wrap_writes_logical_row():
+    history = History(max_size=3)
+    history.set(step=0)
+    for step in range(1, 5):
+        history.add(step=step)
+
+    history["step", 0] = 20
+    history["step", [-1]] = [40]
+    history["step", []] = []
+
+    assert list(history["step"]) == [20, 3, 40]
+
+
+@pytest.mark.parametrize("n_rows", [3, 5, 6, 11])
+def test_tail_matches_full_column(n_rows):
+    history = History(max_size=5)
+    history.set(step=0)
+    for step in range(1, n_rows):
+        history.add(step=step)
+
+    column = history["step"]
+    for k in range(history.size + 2):
+        expected = column[max(0, history.size - k) :] if k else column[:0]
+        np.testing.assert_array_equal(history.tail("step", k), expected)
+
+
+def test_tail_rejects_negative_k():
+    history = History(max_size=5)
+    history.set(step=0)
+
+    with pytest.raises(ValueError):
+        history.tail("step", -1)
+
+
+@pytest.mark.parametrize("prefill", [0, 2, 4, 7])
+@pytest.mark.parametrize("n_rows", [1, 3, 5, 12])
+def test_extend_matches_repeated_add(prefill, n_rows):
+    def row(step):
+        return dict(
+            step=step,
+            price=step * 1.5,
+            pair=[step, -step],
+            info={"a": step, "b": step * 2.0},
+        )
+
+    added, extended = History(max_size=5), History(max_size=5)
+    for history in (added, extended):
+        history.set(**row(0))
+        for step in range(1, prefill + 1):
+            history.add(**row(step))
+
+    rows = [row(step) for step in range(prefill + 1, prefill + 1 + n_rows)]
+    for values in rows:
+        added.add(**values)
+    extended.extend(
+        step=[values["step"] for values in rows],
+        price=[values["price"] for values in rows],
+        pair=[values["pair"] for values in rows],
+        info={
+            "b": [values["info"]["b"] for values in rows],
+            "a": [values["info"]["a"] for values in rows],
+        },
+    )
+
+    assert len(extended) == len(added)
+    for column in added.columns:
+        np.testing.assert_array_equal(extended[column], added[column])
+
+
+def test_extend_rejects_unknown_dict_keys():
+    history = History(max_size=5)
+    history.set(info={"a": 1, "b": 2})
+
+    with pytest.raises(ValueError):
+        history.extend(info={"a": [1], "c": [2]})
+
+
+def test_extend_requires_set():
+    with pytest.raises(ValueError):
+        History(max_size=5).extend(step=[1, 2])